@@ -1,36 +1,48 @@
-from typing import Dict, Any, Callable, Optional
+from typing import Dict, Any, Callable, Optional, Tuple, Type
 from app.schemas import WorkflowState
 from app.engine.registry import ToolRegistry
 
 
 class Node:
+    __slots__ = ("name", "tool_name", "func")
+
     def __init__(self, name: str, tool_name: str):
         self.name = name
         self.tool_name = tool_name
+        # Resolved once here rather than on every execution (raises if unknown)
+        self.func = ToolRegistry.get_tool(tool_name)
+
+    def rebind(self):
+        """Re-resolves the tool, e.g. after it was re-registered in the ToolRegistry."""
+        self.func = ToolRegistry.get_tool(self.tool_name)
 
     def run(self, state: WorkflowState) -> WorkflowState:
         """Executes the tool associated with this node."""
-        func = ToolRegistry.get_tool(self.tool_name)
         # We assume tools accept the state and return a modified state or dict
-        result = func(state)
-        return result
+        return self.func(state)
 
 
 class WorkflowGraph:
-    def __init__(self):
+    def __init__(self, state_cls: Type[WorkflowState] = WorkflowState):
+        # State model created for each run; workflows may use a typed subclass
+        self.state_cls = state_cls
         self.nodes: Dict[str, Node] = {}
         self.edges: Dict[str, str] = {}  # Simple map: "node_a" -> "node_b"
         self.conditional_edges: Dict[str, Callable[[WorkflowState], str]] = {}
         self.entry_point: Optional[str] = None
+        # Per-node (tool_func, static_next, condition_func), built lazily by _compile()
+        self._runtime: Optional[Dict[str, Tuple[Callable, Optional[str], Optional[Callable]]]] = None
 
     def add_node(self, name: str, tool_name: str):
         self.nodes[name] = Node(name, tool_name)
+        self._runtime = None
 
     def set_entry_point(self, name: str):
         self.entry_point = name
 
     def add_edge(self, source: str, destination: str):
         self.edges[source] = destination
+        self._runtime = None
 
     def add_conditional_edge(self, source: str, condition_func: Callable[[WorkflowState], str]):
         """
@@ -38,16 +50,35 @@ class WorkflowGraph:
         condition_func: A function that takes State and returns the name of the next node
         """
         self.conditional_edges[source] = condition_func
+        self._runtime = None
+
+    def rebind(self):
+        """Re-resolves every node's tool after tools were re-registered in the ToolRegistry."""
+        for node in self.nodes.values():
+            node.rebind()
+        self._runtime = None
+
+    def _compile(self) -> Dict[str, Tuple[Callable, Optional[str], Optional[Callable]]]:
+        """
+        Pre-links every node's bound tool with its routing, so each step of run()
+        is one dict lookup plus a direct call of the tool.
+        """
+        self._runtime = {
+            name: (node.func, self.edges.get(name), self.conditional_edges.get(name))
+            for name, node in self.nodes.items()
+        }
+        return self._runtime
 
-    def run(self, initial_payload: Any) -> WorkflowState:
+    def run(self, initial_payload: Any, state_cls: Optional[Type[WorkflowState]] = None) -> WorkflowState:
         """Main execution loop"""
         if not self.entry_point:
             raise ValueError("Graph has no entry point defined.")
 
         # Initialize State
-        state = WorkflowState(input_data=initial_payload)
+        state = (state_cls or self.state_cls)(input_data=initial_payload)
         state.log(f"Workflow started with input: {initial_payload}")
 
+        runtime = self._runtime if self._runtime is not None else self._compile()
         current_node_name = self.entry_point
 
         while current_node_name:
@@ -56,15 +87,16 @@ class WorkflowGraph:
                 state.status = "COMPLETED"
                 break
 
-            current_node = self.nodes.get(current_node_name)
-            if not current_node:
+            entry = runtime.get(current_node_name)
+            if entry is None:
                 raise ValueError(f"Node '{current_node_name}' not found.")
+            tool_func, static_next, condition_func = entry
 
             # EXECUTE
             state.log(f"Executing Node: {current_node_name}")
             try:
-                # Run the node logic (which runs the tool)
-                current_node.run(state)
+                # Run the node's tool
+                tool_func(state)
             except Exception as e:
                 state.log(f"Error in node {current_node_name}: {str(e)}")
                 state.status = "FAILED"
@@ -74,14 +106,13 @@ class WorkflowGraph:
             next_node = None
 
             # 1. Check Conditional Edges first (priority)
-            if current_node_name in self.conditional_edges:
-                condition_func = self.conditional_edges[current_node_name]
+            if condition_func is not None:
                 next_node = condition_func(state)
                 state.log(f"Condition met. Routing to: {next_node}")
 
             # 2. Check Static Edges
-            elif current_node_name in self.edges:
-                next_node = self.edges[current_node_name]
+            elif static_next is not None:
+                next_node = static_next
                 state.log(f"Moving to: {next_node}")
 
             # 3. If no edge, we stop (implicit END)
@@ -1,9 +1,12 @@
 from typing import Callable, Dict, Optional
 
+__all__ = ["ToolRegistry"]
+
 
 class ToolRegistry:
     _tools: Dict[str, Callable] = {}
     _conditions: Dict[str, Callable] = {}
+    _condition_names: Dict[int, str] = {}  # Reverse index: id(func) -> name
 
     # --- Tool Management ---
     @classmethod
@@ -32,7 +35,11 @@ class ToolRegistry:
         """Decorator to register a function as a condition for edges."""
 
         def decorator(func: Callable):
+            previous = cls._conditions.get(name)
+            if previous is not None:
+                cls._condition_names.pop(id(previous), None)
             cls._conditions[name] = func
+            cls._condition_names[id(func)] = name
             return func
 
         return decorator
@@ -46,7 +53,4 @@ class ToolRegistry:
     @classmethod
     def get_condition_name(cls, func: Callable) -> Optional[str]:
         """Reverse lookup: find the registered name for a given function object."""
-        for name, registered_func in cls._conditions.items():
-            if registered_func == func:
-                return name
-        return None
\ No newline at end of file
+        return cls._condition_names.get(id(func))
\ No newline at end of file
@@ -1,24 +1,52 @@
-from typing import Dict, Any, List, Optional
+from collections import deque
+from typing import Deque, Dict, Any, List, Optional
 from datetime import datetime
 
-from pydantic import BaseModel, Field
-from sqlalchemy import Column, String, Text, JSON, DateTime
+from pydantic import BaseModel, ConfigDict, Field, field_serializer, field_validator
+from sqlalchemy import Column, String, JSON, DateTime
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.ext.mutable import MutableDict
 from app.db_session import Base
 
+__all__ = [
+    "WorkflowState",
+    "DBGraphDefinition", "DBWorkflowRun",
+    "NodeConfig", "EdgeConfig", "ConditionalEdgeConfig",
+    "CreateGraphRequest", "RunGraphRequest", "RunGraphResponse",
+]
+
 # --- 1. Core Workflow State Model ---
 
+# Logs are a ring buffer: runaway loops keep only the newest entries.
+MAX_LOG_ENTRIES = 5_000
+
+
 class WorkflowState(BaseModel):
     """
     The shared state that flows through the graph.
     """
     input_data: Any = Field(default=None, description="Initial input for the workflow")
     data: Dict[str, Any] = Field(default_factory=dict)
-    logs: List[str] = Field(default_factory=list)
+    logs: Deque[str] = Field(default_factory=lambda: deque(maxlen=MAX_LOG_ENTRIES))
     status: str = "PENDING"
 
-    class Config:
-        extra = "allow"
+    # Assignments are not re-validated: nodes mutate state on every step.
+    # extra="allow" costs each state a __pydantic_extra__ dict, but registered
+    # tools are free to attach their own attributes to the state.
+    model_config = ConfigDict(extra="allow", validate_assignment=False)
+
+    @field_validator("logs")
+    @classmethod
+    def _bound_logs(cls, logs: Deque[str]) -> Deque[str]:
+        if logs.maxlen == MAX_LOG_ENTRIES:
+            return logs
+        return deque(logs, maxlen=MAX_LOG_ENTRIES)
+
+    @field_serializer("logs")
+    def _logs_as_list(self, logs: Deque[str]) -> List[str]:
+        # Plain list in every dump mode, so python-mode dumps can be stored
+        # in a JSON column or handed to orjson as-is.
+        return list(logs)
 
     def log(self, message: str):
         self.logs.append(message)
@@ -26,12 +54,17 @@ class WorkflowState(BaseModel):
 
 # --- 2. Database Models ---
 
+# Postgres stores JSON documents as binary JSONB (already parsed, indexable);
+# other databases keep them as JSON text.
+JSONDocument = JSON().with_variant(JSONB(), "postgresql")
+
+
 class DBGraphDefinition(Base):
     __tablename__ = "graph_definitions"
 
     id = Column(String, primary_key=True, index=True)
     name = Column(String, index=True, unique=True)
-    definition = Column(Text)
+    definition = Column(JSONDocument)  # Decoded to a dict by SQLAlchemy on load
     created_at = Column(DateTime, default=datetime.utcnow)
 
 
@@ -40,7 +73,7 @@ class DBWorkflowRun(Base):
 
     id = Column(String, primary_key=True, index=True)
     graph_id = Column(String, index=True)
-    state_json = Column(MutableDict.as_mutable(JSON), default=dict, nullable=False)
+    state_json = Column(MutableDict.as_mutable(JSONDocument), default=dict, nullable=False)
     status = Column(String, default="PENDING")
     started_at = Column(DateTime, default=datetime.utcnow)
     finished_at = Column(DateTime, nullable=True)
@@ -0,0 +1,17 @@
+import functools
+import importlib
+
+# Modules that register tools and conditions with the ToolRegistry on import.
+WORKFLOW_MODULES = (
+    "app.workflows.code_review",
+)
+
+
+@functools.cache
+def register_all() -> None:
+    """
+    Registers every workflow's tools and conditions. Cached, so only the first
+    call per process does any work.
+    """
+    for module in WORKFLOW_MODULES:
+        importlib.import_module(module)
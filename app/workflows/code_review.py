@@ -1,18 +1,83 @@
+import functools
+import re
+from typing import List
+
+from pydantic import Field, model_serializer
+
 from app.engine.registry import ToolRegistry
 from app.engine.graph import WorkflowGraph
 from app.schemas import WorkflowState
 
 
+# Keywords that add to the simulated complexity score (each counted once).
+_COMPLEXITY_WEIGHTS = {"for": 5, "if": 5, "while": 5, "nested": 10}
+_DEF_RE = re.compile(r"^\s*def\s+(\w+)\s*\(", re.MULTILINE)
+
+
+def _contains_word(code: str, word: str) -> bool:
+    """Whole-word test: str.find (stops at the first hit) plus a boundary check."""
+    start = code.find(word)
+    while start != -1:
+        end = start + len(word)
+        before = code[start - 1] if start else " "
+        after = code[end] if end < len(code) else " "
+        if not (before.isalnum() or before == "_" or after.isalnum() or after == "_"):
+            return True
+        start = code.find(word, start + 1)
+    return False
+
+
+@functools.lru_cache(maxsize=128)
+def _keyword_score(code: str) -> int:
+    # input_data never changes during a run, so every review round after the
+    # first is a cache hit instead of another scan of the code.
+    return sum(weight for keyword, weight in _COMPLEXITY_WEIGHTS.items() if _contains_word(code, keyword))
+
+
+# --- 0. Typed State ---
+
+class CodeReviewState(WorkflowState):
+    """
+    WorkflowState with the fields the code review loop reads on every pass,
+    so the tools use plain attributes instead of lookups in `data`.
+    Used by graphs built with create_code_review_graph(); graphs rebuilt from
+    a stored definition run on a plain WorkflowState, where the tools use
+    `data` directly. API consumers only see `data`, so the fields are copied
+    into it once when the state is dumped, not on every step.
+    """
+    functions: List[str] = Field(default_factory=list, exclude=True)
+    review_round: int = Field(default=0, exclude=True)
+    complexity_score: int = Field(default=100, exclude=True)
+
+    @model_serializer(mode="wrap")
+    def _mirror_into_data(self, handler):
+        dumped = handler(self)
+        dumped["data"] = {
+            **dumped["data"],
+            "functions": list(self.functions),
+            "review_round": self.review_round,
+            "complexity_score": self.complexity_score,
+        }
+        return dumped
+
+
 # --- 1. Define the Tools ---
 
+# The tools branch on the exact state type: isinstance() on a pydantic model
+# goes through ABCMeta.__instancecheck__, which costs more than the lookup it
+# would save.
+
 @ToolRegistry.register("extract_code")
 def extract_code(state: WorkflowState):
     """Simulates parsing the code."""
     code = state.input_data
-    functions = [line.split("(")[0].replace("def ", "").strip()
-                 for line in code.split("\n") if "def " in line]
-    state.data["functions"] = functions
-    state.data["review_round"] = 0
+    functions = _DEF_RE.findall(code)
+    if type(state) is CodeReviewState:
+        state.functions = functions
+        state.review_round = 0
+    else:
+        state.data["functions"] = functions
+        state.data["review_round"] = 0
     state.log(f"Extracted {len(functions)} functions: {functions}")
     return state
 
@@ -20,18 +85,15 @@ def extract_code(state: WorkflowState):
 @ToolRegistry.register("check_complexity")
 def check_complexity(state: WorkflowState):
     """Simulates calculating Cyclomatic Complexity."""
-    code = state.input_data
-    score = 0
-    if "for" in code: score += 5
-    if "if" in code: score += 5
-    if "while" in code: score += 5
-    if "nested" in code: score += 10
+    score = _keyword_score(state.input_data)
 
     # Simulate improvement over rounds
-    current_round = state.data.get("review_round", 0)
-    adjusted_score = max(0, score - (current_round * 5))
-
-    state.data["complexity_score"] = adjusted_score
+    if type(state) is CodeReviewState:
+        current_round = state.review_round
+        adjusted_score = state.complexity_score = max(0, score - (current_round * 5))
+    else:
+        current_round = state.data.get("review_round", 0)
+        adjusted_score = state.data["complexity_score"] = max(0, score - (current_round * 5))
     state.log(f"Calculated complexity score: {adjusted_score} (Round {current_round})")
     return state
 
@@ -39,7 +101,10 @@ def check_complexity(state: WorkflowState):
 @ToolRegistry.register("generate_improvements")
 def generate_improvements(state: WorkflowState):
     """Simulates an AI suggesting changes."""
-    state.data["review_round"] += 1
+    if type(state) is CodeReviewState:
+        state.review_round += 1
+    else:
+        state.data["review_round"] += 1
     state.log("Generated improvement suggestions. Re-evaluating...")
     return state
 
@@ -52,17 +117,17 @@ def quality_gate(state: WorkflowState) -> str:
     Decides if we loop back or finish.
     Threshold: Score must be < 10.
     """
-    score = state.data.get("complexity_score", 100)
-    if score < 10:
-        return "END"
+    if type(state) is CodeReviewState:
+        score = state.complexity_score
     else:
-        return "improve"
+        score = state.data.get("complexity_score", 100)
+    return "END" if score < 10 else "improve"
 
 
 # --- 3. Build the Graph ---
 
 def create_code_review_graph() -> WorkflowGraph:
-    graph = WorkflowGraph()
+    graph = WorkflowGraph(state_cls=CodeReviewState)
 
     graph.add_node("extract", "extract_code")
     graph.add_node("analyze", "check_complexity")
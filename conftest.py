@@ -0,0 +1,10 @@
+import atexit
+import os
+import shutil
+import tempfile
+
+# Point the app at a throwaway database before any test module imports it.
+# Workflow worker processes spawned during the tests inherit the variable.
+_db_dir = tempfile.mkdtemp(prefix="workflow-test-")
+atexit.register(shutil.rmtree, _db_dir, ignore_errors=True)
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_db_dir, 'workflow.db')}"
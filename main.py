@@ -1,75 +1,241 @@
+import os
+import sys
+import time
+import asyncio
+import hashlib
 import uuid
-import json
+import threading
+import orjson
 import uvicorn
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, HTTPException, BackgroundTasks, Depends
+from fastapi import FastAPI, HTTPException, Depends, Header, Response
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import Text, case, cast, func as sql_func, insert, literal_column, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import Session
 from app.schemas import (
     CreateGraphRequest, RunGraphRequest,
     WorkflowState, DBGraphDefinition, DBWorkflowRun,
-    RunGraphResponse
+    RunGraphResponse, MAX_LOG_ENTRIES
 )
 from app.engine.graph import WorkflowGraph
 from app.engine.registry import ToolRegistry
-from app.db_session import engine, Base, get_db, SessionLocal
-from app.workflows.code_review import create_code_review_graph
+from app.db_session import engine, Base, get_db, SessionLocal, WorkerSession
+from app.workflows import register_all
+
+
+def new_id() -> str:
+    """
+    Returns a time-ordered UUIDv7 string (RFC 9562), so new rows are appended
+    at the end of the primary-key index instead of landing at random pages.
+    """
+    if hasattr(uuid, "uuid7"):  # Python 3.14+
+        return str(uuid.uuid7())
+    # 48-bit millisecond timestamp followed by 80 random bits, then stamp the
+    # version (7) and variant (0b10) fields over the random bits.
+    value = (time.time_ns() // 1_000_000) << 80 | int.from_bytes(os.urandom(10), "big")
+    value = (value & ~(0xF << 76)) | (0x7 << 76)
+    value = (value & ~(0x3 << 62)) | (0x2 << 62)
+    return str(uuid.UUID(int=value))
+
+
+def create_tables(attempts: int = 5):
+    """
+    Creates missing tables. Server workers starting together can race on the
+    same CREATE TABLE; each failure means another worker made progress, so
+    re-checking converges after a few attempts.
+    """
+    for attempt in range(attempts):
+        try:
+            Base.metadata.create_all(bind=engine)
+            return
+        except OperationalError:
+            if attempt == attempts - 1:
+                raise
+
+
+def dialect_insert(model):
+    """INSERT construct for the engine's dialect, which adds ON CONFLICT support."""
+    if engine.dialect.name == "postgresql":
+        return postgresql.insert(model)
+    return sqlite.insert(model)
+
+
+def build_demo_graph() -> Tuple[WorkflowGraph, Dict[str, Any]]:
+    """Builds the code review demo graph along with its serialized definition."""
+    from app.workflows.code_review import create_code_review_graph
+
+    demo_graph = create_code_review_graph()
+
+    # Serialize the graph (including conditional edges)
+    conditional_edges_data = []
+    for src, func in demo_graph.conditional_edges.items():
+        func_name = ToolRegistry.get_condition_name(func)
+        if func_name:
+            conditional_edges_data.append({
+                "from_node": src,
+                "condition_function": func_name
+            })
+
+    def_data = {
+        "name": "Code Review Agent Demo",
+        "nodes": [{"name": n.name, "tool_name": n.tool_name} for n in demo_graph.nodes.values()],
+        "edges": [{"from_node": src, "to_node": dest} for src, dest in demo_graph.edges.items()],
+        "conditional_edges": conditional_edges_data,
+        "entry_point": demo_graph.entry_point
+    }
+    return demo_graph, def_data
 
 
 # --- LIFESPAN MANAGER (Replaces startup_event) ---
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # --- STARTUP LOGIC ---
-    Base.metadata.create_all(bind=engine)
+    register_all()
+    create_tables()
     print(">>> Database tables created/checked.")
 
-    db = SessionLocal()
-    # Check if demo graph exists
-    if not db.query(DBGraphDefinition).filter(DBGraphDefinition.id == "demo-review").first():
-        demo_graph = create_code_review_graph()
-
-        # Serialize the graph (including conditional edges)
-        conditional_edges_data = []
-        for src, func in demo_graph.conditional_edges.items():
-            func_name = ToolRegistry.get_condition_name(func)
-            if func_name:
-                conditional_edges_data.append({
-                    "from_node": src,
-                    "condition_function": func_name
-                })
-
-        def_data = {
-            "name": "Code Review Agent Demo",
-            "nodes": [{"name": n.name, "tool_name": n.tool_name} for n in demo_graph.nodes.values()],
-            "edges": [{"from_node": src, "to_node": dest} for src, dest in demo_graph.edges.items()],
-            "conditional_edges": conditional_edges_data,
-            "entry_point": demo_graph.entry_point
-        }
-
-        db_graph = DBGraphDefinition(
-            id="demo-review",
-            name="Code Review Agent Demo",
-            definition=json.dumps(def_data)
+    # Seed the demo graph with one idempotent statement: a single round trip per
+    # process start, and safe when several server workers start at once.
+    _, def_data = build_demo_graph()
+    with SessionLocal() as db:
+        result = db.execute(
+            dialect_insert(DBGraphDefinition)
+            .values(id="demo-review", name="Code Review Agent Demo", definition=def_data)
+            .on_conflict_do_nothing()
         )
-        db.add(db_graph)
         db.commit()
+    if result.rowcount:
         print(">>> Startup: Loaded 'demo-review' graph into DB.")
-    db.close()
+
+    # The worker pool lives only as long as the app, so importing this module
+    # (server supervisor, pool children, tests, CLI tools) creates no processes.
+    app.state.executor = _new_executor()
+
+    # Submitted runs wait in a bounded queue; one long-lived dispatcher per
+    # worker process feeds the pool, so at most WORKER_PROCESSES runs are in
+    # flight and a full queue pushes back on clients with 503.
+    app.state.run_queue = asyncio.Queue(maxsize=RUN_QUEUE_MAXSIZE)
+    dispatchers = [
+        asyncio.create_task(_dispatch_runs(app.state.run_queue))
+        for _ in range(WORKER_PROCESSES)
+    ]
 
     yield  # The application runs here
 
-    # --- SHUTDOWN LOGIC (Optional) ---
+    # --- SHUTDOWN LOGIC ---
     print(">>> Shutting down...")
+    # Every queued run is already stored as SUBMITTED, so finish them first.
+    await app.state.run_queue.join()
+    for task in dispatchers:
+        task.cancel()
+    await asyncio.gather(*dispatchers, return_exceptions=True)
+    app.state.executor.shutdown(wait=True)
 
 
 # --- INITIAL SETUP ---
 app = FastAPI(title="Workflow Engine API", lifespan=lifespan)
 
+# Workflows run in separate worker processes, so CPU-bound graphs neither hold
+# the API process's GIL nor queue behind each other. Each execution opens its
+# own DB session. "spawn" gives children a clean import of this module (no
+# inherited DB connections or threads); the initializer registers the tools.
+# Every API server worker owns a pool, so the cores are split between them
+# unless WORKFLOW_WORKERS is set.
+
+
+def _api_worker_count() -> int:
+    """
+    Number of API server workers, as uvicorn resolves it: --workers, else
+    WEB_CONCURRENCY, else 1. uvicorn spawns its workers with the launcher's
+    argv, so `uvicorn main:app --workers N` is visible here.
+    """
+    for i, arg in enumerate(sys.argv):
+        if arg == "--workers" and i + 1 < len(sys.argv):
+            return int(sys.argv[i + 1])
+        if arg.startswith("--workers="):
+            return int(arg.split("=", 1)[1])
+    return int(os.getenv("WEB_CONCURRENCY", "1"))
+
+
+API_WORKERS = _api_worker_count()
+WORKER_PROCESSES = int(os.getenv("WORKFLOW_WORKERS", max(1, (os.cpu_count() or 4) // API_WORKERS)))
+
+
+def _init_worker_process():
+    """Runs once in each worker process: registers tools, pre-builds the demo graph."""
+    register_all()
+    # Build the demo graph once and share it across runs; WorkflowGraph.run
+    # creates a fresh state per call, so the instance itself is never mutated.
+    # It is cached under the stored row's text, which the worker hashes on
+    # every run, since the database may format JSON differently (Postgres
+    # normalizes JSONB). If the row holds a different definition, nothing is
+    # seeded and the graph is rebuilt from the DB on first use.
+    demo_graph, def_data = build_demo_graph()
+    try:
+        with SessionLocal() as db:
+            definition_text = db.scalar(
+                select(cast(DBGraphDefinition.definition, Text))
+                .where(DBGraphDefinition.id == "demo-review")
+            )
+    except OperationalError:
+        # Seeding is only an optimization; an initializer error would break the pool
+        definition_text = None
+    if definition_text is not None and orjson.loads(definition_text) == def_data:
+        cache_graph("demo-review", definition_text, demo_graph)
+
+
+def _new_executor() -> ProcessPoolExecutor:
+    return ProcessPoolExecutor(
+        max_workers=WORKER_PROCESSES,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker_process,
+    )
+
+
+def submit_run(run_id: str) -> Future:
+    """Queues a run on the app's worker pool, replacing the pool if a worker process died."""
+    try:
+        return app.state.executor.submit(_execution_worker, run_id)
+    except BrokenProcessPool:
+        app.state.executor = _new_executor()
+        return app.state.executor.submit(_execution_worker, run_id)
+
+
+# Runs accepted but not yet handed to the worker pool, per API server worker.
+RUN_QUEUE_MAXSIZE = 1000
+
+
+async def _dispatch_runs(queue: asyncio.Queue):
+    """Feeds queued run ids to the worker pool, one run at a time, until cancelled."""
+    while True:
+        run_id = await queue.get()
+        try:
+            await asyncio.wrap_future(submit_run(run_id))
+        except Exception as e:
+            # _execution_worker handles its own errors; this is the pool itself
+            # failing, e.g. a worker process killed mid-run. The run can't
+            # report back, so fail it here rather than leave it SUBMITTED.
+            print(f"Dispatch Error ({run_id}): {e}")
+            try:
+                await run_in_threadpool(_fail_run_in_new_session, run_id, e)
+            except Exception as db_error:
+                print(f"Dispatch Error ({run_id}): could not mark run FAILED: {db_error}")
+        finally:
+            queue.task_done()
+
 
 # --- WORKER FUNCTIONS ---
 
-def load_graph_from_db_definition(graph_definition: str) -> WorkflowGraph:
-    """Helper function to instantiate WorkflowGraph from stored JSON."""
-    data = json.loads(graph_definition)
+def _build_graph_from_dict(data: Dict[str, Any]) -> WorkflowGraph:
+    """Instantiates a WorkflowGraph from an already-parsed graph definition."""
     graph = WorkflowGraph()
 
     # 1. Add Nodes
@@ -95,100 +261,344 @@ def load_graph_from_db_definition(graph_definition: str) -> WorkflowGraph:
     return graph
 
 
+def load_graph_from_db_definition(graph_definition: str) -> WorkflowGraph:
+    """Helper function to instantiate WorkflowGraph from stored JSON."""
+    return _build_graph_from_dict(orjson.loads(graph_definition))
+
+
+# Compiled graphs keyed by graph_id, stored as (definition_hash, graph). A hit
+# requires the stored definition text to hash the same, so a changed row is
+# rebuilt instead of served stale. Each worker process has its own cache:
+# the demo graph is seeded when the process starts, other graphs on first run.
+_graph_cache: Dict[str, Tuple[str, WorkflowGraph]] = {}
+_graph_cache_lock = threading.Lock()
+
+
+def _definition_hash(definition_text: str) -> str:
+    return hashlib.blake2b(definition_text.encode(), digest_size=8).hexdigest()
+
+
+def cache_graph(graph_id: str, definition_text: str, graph: WorkflowGraph):
+    with _graph_cache_lock:
+        _graph_cache[graph_id] = (_definition_hash(definition_text), graph)
+
+
+def get_cached_graph(graph_id: str, definition_text: str) -> WorkflowGraph:
+    """Returns the compiled graph for graph_id, rebuilding it if its definition changed."""
+    digest = _definition_hash(definition_text)
+    cached = _graph_cache.get(graph_id)
+    if cached is not None and cached[0] == digest:
+        return cached[1]
+    graph = load_graph_from_db_definition(definition_text)
+    with _graph_cache_lock:
+        _graph_cache[graph_id] = (digest, graph)
+    return graph
+
+
 def _execution_worker(run_id: str):
     """The background worker that runs the workflow engine."""
-    worker_db = SessionLocal()
-    db_run = None  # <--- FIX: Initialize variable here to silence IDE warning
+    worker_db = WorkerSession()
+    row = None
 
     try:
-        db_run = worker_db.query(DBWorkflowRun).filter(DBWorkflowRun.id == run_id).one_or_none()
-        if not db_run:
+        # One round trip for everything the worker needs, without hydrating ORM
+        # objects. The graph is outer-joined so a missing definition fails the
+        # run instead of silently skipping it. Only the definition's text is
+        # fetched (cast, as a JSONB driver would decode it): hashing it is
+        # enough on a graph cache hit.
+        row = worker_db.execute(
+            select(
+                DBWorkflowRun.graph_id,
+                DBWorkflowRun.state_json,
+                cast(DBGraphDefinition.definition, Text),
+            )
+            .outerjoin(DBGraphDefinition, DBWorkflowRun.graph_id == DBGraphDefinition.id)
+            .where(DBWorkflowRun.id == run_id)
+        ).one_or_none()
+        if row is None:
             return
 
-        db_graph_def = worker_db.query(DBGraphDefinition).filter(DBGraphDefinition.id == db_run.graph_id).one()
+        graph_id, state_json, definition_text = row
+        if definition_text is None:
+            raise ValueError(f"Graph '{graph_id}' not found.")
+        graph = get_cached_graph(graph_id, definition_text)
 
-        graph = load_graph_from_db_definition(db_graph_def.definition)
-        initial_state = WorkflowState(**db_run.state_json)
+        # The stored state is trusted; read the input straight from the dict
+        final_state = graph.run(state_json.get("input_data"))
 
-        final_state = graph.run(initial_state.input_data)
-
-        db_run.state_json = final_state.dict()
-        db_run.status = "COMPLETED"
+        worker_db.execute(
+            update(DBWorkflowRun)
+            .where(DBWorkflowRun.id == run_id)
+            .values(state_json=final_state.model_dump(mode="json"), status="COMPLETED")
+        )
         worker_db.commit()
 
     except Exception as e:
-        if db_run:
-            current_state = WorkflowState(**db_run.state_json)
-            current_state.log(f"CRITICAL ERROR: {str(e)}")
-            db_run.state_json = current_state.dict()
-            db_run.status = "FAILED"
-            worker_db.commit()
+        if row is not None:
+            worker_db.rollback()
+            _fail_run(worker_db, run_id, e)
         print(f"Worker Error: {e}")
     finally:
         worker_db.close()
 
 
+def _append_log_sql(message: str):
+    """
+    state_json with `message` appended to its logs, computed by the database
+    rather than by rewriting the whole state blob. Like WorkflowState.logs,
+    the oldest entry is dropped once MAX_LOG_ENTRIES is reached.
+    """
+    state_json = DBWorkflowRun.state_json
+    if engine.dialect.name == "postgresql":
+        logs = state_json.op("->", return_type=JSONB)("logs")
+        logs = case(
+            (sql_func.jsonb_array_length(logs) >= MAX_LOG_ENTRIES, logs.op("-", return_type=JSONB)(0)),
+            else_=logs,
+        )
+        appended = logs.op("||", return_type=JSONB)(sql_func.to_jsonb(cast(message, Text)))
+        return sql_func.jsonb_set(state_json, literal_column("'{logs}'::text[]"), appended)
+
+    # SQLite: '$.logs[#]' is the array end
+    appended = sql_func.json_insert(state_json, "$.logs[#]", message)
+    return case(
+        (sql_func.json_array_length(state_json, "$.logs") >= MAX_LOG_ENTRIES,
+         sql_func.json_remove(appended, "$.logs[0]")),
+        else_=appended,
+    )
+
+
+def _fail_run(db: Session, run_id: str, error: Exception):
+    """Marks a still-SUBMITTED run FAILED and logs the error to its state."""
+    db.execute(
+        update(DBWorkflowRun)
+        .where(DBWorkflowRun.id == run_id, DBWorkflowRun.status == "SUBMITTED")
+        .values(state_json=_append_log_sql(f"CRITICAL ERROR: {str(error)}"), status="FAILED")
+    )
+    db.commit()
+
+
+def _fail_run_in_new_session(run_id: str, error: Exception):
+    """_fail_run for callers outside a worker, e.g. the dispatcher. Blocking."""
+    with SessionLocal() as db:
+        _fail_run(db, run_id, error)
+
+
+# --- RESPONSE CACHE ---
+
+# Encoded /graph/state responses and their headers, keyed by run_id. Terminal
+# runs never change again, so their payloads live in a bounded LRU with no
+# expiry. In-flight runs are cached as (expires_at, payload, headers) for a
+# short TTL, which folds polling bursts into one DB read.
+STATE_CACHE_TTL = 0.2
+STATE_CACHE_MAXSIZE = 1024
+TERMINAL_STATUSES = ("COMPLETED", "FAILED")
+# Clients may reuse a finished run's response for this long without asking.
+TERMINAL_MAX_AGE = 60
+# Upper bound (seconds) for the Retry-After hint sent while a run is in flight.
+RETRY_AFTER_MAX = 8
+_terminal_state_cache: "OrderedDict[str, Tuple[bytes, Dict[str, str]]]" = OrderedDict()
+_running_state_cache: Dict[str, Tuple[float, bytes, Dict[str, str]]] = {}
+_state_cache_lock = threading.Lock()
+
+
+def _get_cached_state_response(run_id: str) -> Optional[Tuple[bytes, Dict[str, str]]]:
+    with _state_cache_lock:
+        cached = _terminal_state_cache.get(run_id)
+        if cached is not None:
+            _terminal_state_cache.move_to_end(run_id)
+            return cached
+    cached = _running_state_cache.get(run_id)
+    if cached is not None and cached[0] > time.monotonic():
+        return cached[1], cached[2]
+    return None
+
+
+def _cache_state_response(run_id: str, payload: bytes, terminal: bool) -> Dict[str, str]:
+    """Caches an encoded state and returns the response headers that go with it."""
+    etag = f'"{hashlib.blake2b(payload, digest_size=8).hexdigest()}"'
+    with _state_cache_lock:
+        if terminal:
+            headers = {"ETag": etag, "Cache-Control": f"max-age={TERMINAL_MAX_AGE}"}
+            _running_state_cache.pop(run_id, None)
+            _terminal_state_cache[run_id] = (payload, headers)
+            _terminal_state_cache.move_to_end(run_id)
+            if len(_terminal_state_cache) > STATE_CACHE_MAXSIZE:
+                _terminal_state_cache.popitem(last=False)
+        else:
+            # Back off the suggested poll interval while the state stays the
+            # same, and reset it as soon as the run makes progress.
+            previous = _running_state_cache.get(run_id)
+            retry_after = 1
+            if previous is not None and previous[2]["ETag"] == etag:
+                retry_after = min(int(previous[2]["Retry-After"]) * 2, RETRY_AFTER_MAX)
+            headers = {"ETag": etag, "Cache-Control": "no-cache", "Retry-After": str(retry_after)}
+            if previous is None and len(_running_state_cache) >= STATE_CACHE_MAXSIZE:
+                # Dicts keep insertion order, so this evicts the oldest entry
+                _running_state_cache.pop(next(iter(_running_state_cache)))
+            _running_state_cache[run_id] = (time.monotonic() + STATE_CACHE_TTL, payload, headers)
+    return headers
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+
 # --- API ENDPOINTS ---
 
 @app.post("/graph/create")
 def create_graph(request: CreateGraphRequest, db: Session = Depends(get_db)):
     """Allows creating a custom graph via JSON and saves to DB."""
 
+    # Dump once; the same dict is validated and then stored (no JSON round trip).
+    definition = request.model_dump()
+
     # Validation
     try:
-        load_graph_from_db_definition(request.json())
+        _build_graph_from_dict(definition)
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Invalid graph definition: {str(e)}")
 
-    graph_id = str(uuid.uuid4())
-    db_graph = DBGraphDefinition(
-        id=graph_id,
-        name=request.name,
-        definition=request.json()
-    )
-
-    try:
-        db.add(db_graph)
-        db.commit()
-    except Exception:
-        db.rollback()
-        raise HTTPException(status_code=400, detail="Graph with this name likely already exists.")
+    # A taken name is detected by the empty RETURNING of the same statement,
+    # so a duplicate costs neither a pre-check SELECT nor a failed INSERT.
+    graph_id = db.execute(
+        dialect_insert(DBGraphDefinition)
+        .values(id=new_id(), name=request.name, definition=definition)
+        .on_conflict_do_nothing(index_elements=[DBGraphDefinition.name])
+        .returning(DBGraphDefinition.id)
+    ).scalar_one_or_none()
+    db.commit()
+    if graph_id is None:
+        raise HTTPException(status_code=409, detail=f"Graph with name '{request.name}' already exists.")
 
     return {"graph_id": graph_id, "message": f"Graph '{request.name}' created successfully"}
 
 
+def _initial_run_row(run_id: str, request: RunGraphRequest) -> Dict[str, Any]:
+    initial_state = WorkflowState(input_data=request.input_data)
+    initial_state.log("Run initialized, waiting for execution...")
+    return {
+        "id": run_id,
+        "graph_id": request.graph_id,
+        "state_json": initial_state.model_dump(mode="json"),
+        "status": "SUBMITTED",
+    }
+
+
+def _insert_run(run_id: str, request: RunGraphRequest) -> bool:
+    """Stores a SUBMITTED run. Returns False if the graph doesn't exist. Blocking."""
+    with SessionLocal() as db:
+        # The existence check and the insert share a single transaction/commit.
+        with db.begin():
+            graph_exists = db.query(DBGraphDefinition.id).filter_by(id=request.graph_id).scalar()
+            if not graph_exists:
+                return False
+
+            db.execute(insert(DBWorkflowRun).values(_initial_run_row(run_id, request)))
+    return True
+
+
+def _insert_runs(run_ids: List[str], requests: List[RunGraphRequest]) -> List[str]:
+    """
+    Stores a batch of SUBMITTED runs with one multi-row INSERT and one commit.
+    Returns the graph ids that don't exist, in which case nothing is stored. Blocking.
+    """
+    graph_ids = {request.graph_id for request in requests}
+    with SessionLocal() as db:
+        with db.begin():
+            found = set(db.scalars(select(DBGraphDefinition.id).where(DBGraphDefinition.id.in_(graph_ids))))
+            missing = sorted(graph_ids - found)
+            if missing:
+                return missing
+            db.execute(
+                insert(DBWorkflowRun),
+                [_initial_run_row(run_id, request) for run_id, request in zip(run_ids, requests)],
+            )
+    return []
+
+
+def _read_run_state(run_id: str) -> Optional[Tuple[bytes, Dict[str, str]]]:
+    """Loads and encodes a run's state, caching the result. None if unknown. Blocking."""
+    with SessionLocal() as db:
+        row = (
+            db.query(DBWorkflowRun.state_json, DBWorkflowRun.status)
+            .filter(DBWorkflowRun.id == run_id)
+            .one_or_none()
+        )
+    if row is None:
+        return None
+    # state_json was produced by WorkflowState.model_dump(), so encode it as-is
+    # instead of re-validating it through the model on every poll.
+    payload = orjson.dumps(row.state_json)
+    headers = _cache_state_response(run_id, payload, terminal=row.status in TERMINAL_STATUSES)
+    return payload, headers
+
+
+# The two hot endpoints are async: only their blocking DB work is sent to the
+# threadpool, so cache hits never leave the event loop.
+
 @app.post("/graph/run", response_model=RunGraphResponse)
-def run_workflow(request: RunGraphRequest, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
-    db_graph_def = db.query(DBGraphDefinition).filter(DBGraphDefinition.id == request.graph_id).one_or_none()
-    if not db_graph_def:
+async def run_workflow(request: RunGraphRequest):
+    queue = app.state.run_queue
+    if queue.full():
+        raise HTTPException(status_code=503, detail="Run queue is full, retry later.")
+
+    run_id = new_id()
+    if not await run_in_threadpool(_insert_run, run_id, request):
         raise HTTPException(status_code=404, detail="Graph not found")
 
-    run_id = str(uuid.uuid4())
-    initial_state = WorkflowState(input_data=request.input_data)
-    initial_state.log("Run initialized, waiting for execution...")
+    # Only queue the run once its row is committed. The queue may have filled
+    # up during the insert; the stored run must not be dropped, so wait.
+    await queue.put(run_id)
+    return RunGraphResponse(run_id=run_id, status="SUBMITTED")
 
-    db_run = DBWorkflowRun(
-        id=run_id,
-        graph_id=request.graph_id,
-        state_json=initial_state.dict(),
-        status="SUBMITTED"
-    )
-    db.add(db_run)
-    db.commit()
-    db.refresh(db_run)
 
-    background_tasks.add_task(_execution_worker, run_id)
-    return RunGraphResponse(run_id=run_id, status=db_run.status)
+@app.post("/graph/run_batch", response_model=List[RunGraphResponse])
+async def run_workflow_batch(requests: List[RunGraphRequest]):
+    """Submits several runs at once; either all of them are stored or none are."""
+    queue = app.state.run_queue
+    if queue.maxsize - queue.qsize() < len(requests):
+        raise HTTPException(status_code=503, detail="Run queue is full, retry later.")
+
+    run_ids = [new_id() for _ in requests]
+    if requests:
+        missing = await run_in_threadpool(_insert_runs, run_ids, requests)
+        if missing:
+            raise HTTPException(status_code=404, detail=f"Graph not found: {', '.join(missing)}")
+
+    for run_id in run_ids:
+        await queue.put(run_id)
+    return [RunGraphResponse(run_id=run_id, status="SUBMITTED") for run_id in run_ids]
 
 
-@app.get("/graph/state/{run_id}", response_model=WorkflowState)
-def get_run_state(run_id: str, db: Session = Depends(get_db)):
-    db_run = db.query(DBWorkflowRun).filter(DBWorkflowRun.id == run_id).one_or_none()
-    if not db_run:
-        raise HTTPException(status_code=404, detail="Run ID not found")
-    return WorkflowState(**db_run.state_json)
+@app.get("/graph/state/{run_id}")
+async def get_run_state(run_id: str, if_none_match: Optional[str] = Header(None)):
+    cached = _get_cached_state_response(run_id)
+    if cached is None:
+        cached = await run_in_threadpool(_read_run_state, run_id)
+        if cached is None:
+            raise HTTPException(status_code=404, detail="Run ID not found")
+    payload, headers = cached
+    # Pollers that send back the last ETag get an empty 304 when nothing changed.
+    if _etag_matches(if_none_match, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    return Response(content=payload, media_type="application/json", headers=headers)
 
 
 # --- ENTRY POINT FOR PYCHARM ---
 if __name__ == "__main__":
-    uvicorn.run(app, host="127.0.0.1", port=8000)
\ No newline at end of file
+    # One API worker per core by default. The environment variable is set here
+    # so the spawned server workers size their workflow pools to match.
+    os.environ.setdefault("WEB_CONCURRENCY", str(os.cpu_count() or 1))
+    # workers > 1 requires the app as an import string. "auto" uses uvloop and
+    # httptools when installed (uvloop is unavailable on Windows).
+    uvicorn.run(
+        "main:app",
+        host="127.0.0.1",
+        port=8000,
+        workers=int(os.environ["WEB_CONCURRENCY"]),
+        loop="auto",
+        http="auto",
+    )
\ No newline at end of file
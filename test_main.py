@@ -0,0 +1,121 @@
+import asyncio
+import time
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from app.schemas import RunGraphRequest
+
+CODE = "def f(x):\n    for i in x:\n        if i: nested = True\n"
+
+
+@pytest.fixture(scope="module")
+def client():
+    # One app lifespan for the module: shutdown also shuts the worker pool down
+    with TestClient(main.app) as client:
+        yield client
+
+
+def _wait_for_terminal(client, run_id, timeout=15.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        response = client.get(f"/graph/state/{run_id}")
+        if response.headers["cache-control"] != "no-cache" or time.monotonic() > deadline:
+            return response
+        time.sleep(0.1)
+
+
+def _count_runs():
+    with main.SessionLocal() as db:
+        return db.query(main.DBWorkflowRun).count()
+
+
+def test_terminal_state_revalidates_with_etag(client):
+    run_id = client.post("/graph/run", json={"graph_id": "demo-review", "input_data": CODE}).json()["run_id"]
+    response = _wait_for_terminal(client, run_id)
+    assert response.status_code == 200
+    assert response.headers["cache-control"] == f"max-age={main.TERMINAL_MAX_AGE}"
+
+    etag = response.headers["etag"]
+    revalidated = client.get(f"/graph/state/{run_id}", headers={"If-None-Match": etag})
+    assert revalidated.status_code == 304
+    assert revalidated.content == b""
+    assert revalidated.headers["etag"] == etag
+
+
+def test_running_state_backs_off_retry_after(client):
+    # Stored but never queued, so the state stays the same between polls
+    run_id = main.new_id()
+    assert main._insert_run(run_id, RunGraphRequest(graph_id="demo-review", input_data=CODE))
+
+    hints = []
+    for _ in range(3):
+        response = client.get(f"/graph/state/{run_id}")
+        assert response.headers["cache-control"] == "no-cache"
+        hints.append(response.headers["retry-after"])
+        time.sleep(main.STATE_CACHE_TTL + 0.05)
+    assert hints == ["1", "2", "4"]
+
+
+def test_run_batch_is_all_or_nothing(client):
+    batch = [
+        {"graph_id": "demo-review", "input_data": CODE},
+        {"graph_id": "no-such-graph", "input_data": CODE},
+    ]
+    stored_before = _count_runs()
+    response = client.post("/graph/run_batch", json=batch)
+    assert response.status_code == 404
+    assert "no-such-graph" in response.json()["detail"]
+    # The valid entry was not stored either
+    assert _count_runs() == stored_before
+
+    response = client.post("/graph/run_batch", json=batch[:1] * 2)
+    assert response.status_code == 200
+    run_ids = [run["run_id"] for run in response.json()]
+    assert len(set(run_ids)) == 2
+    for run_id in run_ids:
+        assert _wait_for_terminal(client, run_id).json()["status"] == "COMPLETED"
+
+
+def test_duplicate_graph_name_conflicts(client):
+    graph = {
+        "name": "single-step",
+        "nodes": [{"name": "extract", "tool_name": "extract_code"}],
+        "edges": [],
+        "entry_point": "extract",
+    }
+    first = client.post("/graph/create", json=graph)
+    assert first.status_code == 200
+
+    duplicate = client.post("/graph/create", json=graph)
+    assert duplicate.status_code == 409
+    assert "single-step" in duplicate.json()["detail"]
+
+
+def test_full_run_queue_rejects_with_503(client, monkeypatch):
+    full_queue = asyncio.Queue(maxsize=1)
+    full_queue.put_nowait("queued-run")
+    monkeypatch.setattr(main.app.state, "run_queue", full_queue)
+
+    stored_before = _count_runs()
+    run = {"graph_id": "demo-review", "input_data": CODE}
+    assert client.post("/graph/run", json=run).status_code == 503
+    assert client.post("/graph/run_batch", json=[run]).status_code == 503
+    assert _count_runs() == stored_before
+
+
+def test_run_lost_to_broken_pool_is_failed(client, monkeypatch):
+    def broken_submit(run_id):
+        future = Future()
+        future.set_exception(BrokenProcessPool("A process in the process pool was terminated abruptly"))
+        return future
+
+    monkeypatch.setattr(main, "submit_run", broken_submit)
+    run_id = client.post("/graph/run", json={"graph_id": "demo-review", "input_data": CODE}).json()["run_id"]
+    response = _wait_for_terminal(client, run_id)
+    assert response.json()["logs"][-1].startswith("CRITICAL ERROR:")
+    with main.SessionLocal() as db:
+        assert db.get(main.DBWorkflowRun, run_id).status == "FAILED"
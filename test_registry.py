@@ -0,0 +1,42 @@
+from app.engine.registry import ToolRegistry
+from app.engine.graph import WorkflowGraph
+
+
+def test_condition_name_reverse_lookup():
+    @ToolRegistry.register_condition("always_end")
+    def always_end(state):
+        return "END"
+
+    assert ToolRegistry.get_condition_name(always_end) == "always_end"
+    assert ToolRegistry.get_condition_name(lambda state: "END") is None
+
+    # Re-registering a name drops the stale reverse entry
+    @ToolRegistry.register_condition("always_end")
+    def always_end_v2(state):
+        return "END"
+
+    assert ToolRegistry.get_condition_name(always_end_v2) == "always_end"
+    assert ToolRegistry.get_condition_name(always_end) is None
+
+
+def test_rebind_picks_up_re_registered_tool():
+    @ToolRegistry.register("rebind_probe")
+    def probe_v1(state):
+        state.data["version"] = 1
+        return state
+
+    graph = WorkflowGraph()
+    graph.add_node("probe", "rebind_probe")
+    graph.add_edge("probe", "END")
+    graph.set_entry_point("probe")
+    assert graph.run(None).data["version"] == 1
+
+    @ToolRegistry.register("rebind_probe")
+    def probe_v2(state):
+        state.data["version"] = 2
+        return state
+
+    # Nodes keep their bound function until the graph is rebound
+    assert graph.run(None).data["version"] == 1
+    graph.rebind()
+    assert graph.run(None).data["version"] == 2